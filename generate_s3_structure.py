@@ -5,10 +5,14 @@ Creates 3 months of data for Opening and Customer folders.
 """
 
 import os
+import mimetypes
 import random
 import string
-import time
-from datetime import datetime, timedelta
+import multiprocessing
+import queue
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import subprocess
 import sys
 
@@ -31,17 +35,42 @@ OPENING_FILE_SPECS = {
     "PID.pdf": 300 * 1024       # 300 KB
 }
 
+# Opening PDFs are identical in every transaction: each is uploaded once under
+# this prefix and copied server-side into the transaction folders. It sits
+# outside the archived folders so leftover templates are never archived
+OPENING_TEMPLATE_PREFIX = "_templates/Opening/"
+OPENING_TEMPLATE_FILES = [filename for filename in OPENING_FILE_SPECS if filename.endswith('.pdf')]
+
+# Transactions handed to each worker process at a time
+TRANSACTIONS_PER_CHUNK = 50
+
 # Customer file specs: 300-1300 KB
 CUSTOMER_FILE_MIN_SIZE = 300 * 1024
 CUSTOMER_FILE_MAX_SIZE = 1300 * 1024
 
+# Random XML padding: maps each random byte onto one of these 64 characters
+# (64 divides 256, so every character is equally likely)
+XML_PADDING_ALPHABET = (string.ascii_letters + string.digits + ' \n').encode('ascii')
+XML_PADDING_TABLE = bytes(XML_PADDING_ALPHABET[i % len(XML_PADDING_ALPHABET)] for i in range(256))
 
-def create_dummy_pdf(filepath, size_bytes):
-    """Create a dummy PDF file with specified size."""
-    # PDF header
-    pdf_header = b"%PDF-1.4\n"
-    # PDF minimal structure
-    pdf_content = b"""1 0 obj
+# Concurrent S3 uploads
+UPLOAD_WORKERS = 50
+
+# Generated files waiting for upload before generation pauses
+UPLOAD_QUEUE_SIZE = 1000
+
+# Files above this size are uploaded in parts
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+# Attempts per S3 request, including botocore's own retries
+S3_MAX_ATTEMPTS = 3
+
+# Flags for creating dummy files (O_BINARY only exists, and matters, on Windows)
+FILE_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+
+
+# PDF header and minimal structure, built once rather than on every file
+PDF_PREFIX = b"%PDF-1.4\n" + b"""1 0 obj
 << /Type /Catalog /Pages 2 0 R >>
 endobj
 2 0 obj
@@ -74,44 +103,62 @@ startxref
 %%EOF
 """
 
-    # Calculate padding needed
-    header_size = len(pdf_header) + len(pdf_content)
-    padding_size = max(0, size_bytes - header_size)
+# XML declaration and document opening/closing around the padding
+XML_PREFIX = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<document>\n  <type>OPA</type>\n  <data>\n'
+)
+XML_SUFFIX = b'  </data>\n</document>\n'
+
+
+def write_buffers(fd, buffers):
+    """
+    Write a list of buffers to a file descriptor with a single writev() syscall
+    where the platform has one. Falls back to os.write() for anything left over.
+    """
+    written = os.writev(fd, buffers) if hasattr(os, 'writev') else 0
+
+    if written < sum(len(buffer) for buffer in buffers):
+        remaining = memoryview(b"".join(buffers))[written:]
+        while remaining:
+            remaining = remaining[os.write(fd, remaining):]
+
 
-    # Create padding with random data
-    padding = b'\x00' * padding_size
+def write_file(filepath, buffers, size_bytes=0):
+    """
+    Write buffers to a new file through a raw file descriptor, bypassing
+    Python's buffered I/O, then zero-extend it to size_bytes if it is shorter.
+    """
+    fd = os.open(filepath, FILE_OPEN_FLAGS, 0o666)
+    try:
+        write_buffers(fd, buffers)
 
-    # Write file
-    with open(filepath, 'wb') as f:
-        f.write(pdf_header)
-        f.write(pdf_content)
-        f.write(padding)
+        # Extend with zero padding (sparse where the filesystem supports it)
+        if size_bytes > sum(len(buffer) for buffer in buffers):
+            os.ftruncate(fd, size_bytes)
+    finally:
+        os.close(fd)
+
+
+def create_dummy_pdf(filepath, size_bytes):
+    """
+    Create a dummy PDF file with specified size.
+
+    The zero padding is never built in memory: the file is extended with
+    ftruncate(), which leaves the tail as a hole on filesystems that support it.
+    """
+    write_file(filepath, [PDF_PREFIX], size_bytes)
 
 
 def create_dummy_xml(filepath, size_bytes):
     """Create a dummy XML file with specified size."""
-    xml_header = b'<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml_start = b'<document>\n  <type>OPA</type>\n  <data>\n'
-    xml_end = b'  </data>\n</document>\n'
-
     # Calculate padding needed
-    header_size = len(xml_header) + len(xml_start) + len(xml_end)
-    padding_size = max(0, size_bytes - header_size)
+    padding_size = max(0, size_bytes - len(XML_PREFIX) - len(XML_SUFFIX))
 
     # Create padding with random text
-    padding = ''.join(random.choices(string.ascii_letters + string.digits + ' \n', k=padding_size))
-
-    # Write file
-    with open(filepath, 'wb') as f:
-        f.write(xml_header)
-        f.write(xml_start)
-        f.write(padding.encode('utf-8'))
-        f.write(xml_end)
-
+    padding = os.urandom(padding_size).translate(XML_PADDING_TABLE)
 
-def generate_transaction_id():
-    """Generate a random transaction ID."""
-    return f"TXN{random.randint(100000, 999999)}"
+    write_file(filepath, [XML_PREFIX, padding, XML_SUFFIX])
 
 
 def set_file_timestamp(filepath, timestamp):
@@ -120,8 +167,48 @@ def set_file_timestamp(filepath, timestamp):
     os.utime(filepath, (timestamp_seconds, timestamp_seconds))
 
 
-def generate_opening_folder(base_dir, start_date, end_date):
-    """Generate Opening folder structure with transactions."""
+def transaction_partition(timestamp):
+    """Get the YYYY/MM partition directory for a transaction timestamp (UTC month)."""
+    utc_timestamp = datetime.fromtimestamp(timestamp.timestamp(), timezone.utc)
+    return os.path.join(utc_timestamp.strftime('%Y'), utc_timestamp.strftime('%m'))
+
+
+def create_transaction(args):
+    """Create a transaction folder with its Opening files (runs in a worker process). Returns the file paths."""
+    opening_dir, txn_id, transaction_timestamp = args
+
+    # Transactions are partitioned as Opening/YYYY/MM/ by their UTC month,
+    # so the monthly archive can list a single prefix
+    txn_dir = os.path.join(opening_dir, transaction_partition(transaction_timestamp), txn_id)
+    # The partition already exists and IDs are unique, so a single mkdir is enough
+    os.mkdir(txn_dir)
+
+    filepaths = []
+
+    # Create each file with slightly different timestamps
+    file_offset_minutes = 0
+    for filename, size in OPENING_FILE_SPECS.items():
+        filepath = os.path.join(txn_dir, filename)
+
+        if filename.endswith('.xml'):
+            create_dummy_xml(filepath, size)
+        else:  # PDF
+            create_dummy_pdf(filepath, size)
+
+        # Set unique timestamp for each file (offset by a few minutes)
+        file_timestamp = transaction_timestamp + timedelta(minutes=file_offset_minutes)
+        set_file_timestamp(filepath, file_timestamp)
+        file_offset_minutes += 1
+        filepaths.append(filepath)
+
+    return filepaths
+
+
+def generate_opening_folder(base_dir, start_date, end_date, upload_queue=None):
+    """
+    Generate Opening folder structure with transactions. Returns (count, total size in bytes).
+    Each completed file is put on upload_queue, if given.
+    """
     opening_dir = os.path.join(base_dir, "Opening")
     os.makedirs(opening_dir, exist_ok=True)
 
@@ -131,43 +218,45 @@ def generate_opening_folder(base_dir, start_date, end_date):
 
     print(f"Generating {total_transactions} transactions in Opening folder...")
 
-    transaction_count = 0
-    for i in range(total_transactions):
-        # Generate transaction ID
-        txn_id = generate_transaction_id()
-        txn_dir = os.path.join(opening_dir, txn_id)
-        os.makedirs(txn_dir, exist_ok=True)
-
-        # Calculate timestamp for this transaction (spread evenly across date range)
-        transaction_timestamp = start_date + timedelta(
-            seconds=i * (days * 86400) / total_transactions
+    # Sequential transaction IDs (never collide) and timestamps spread evenly across date range
+    transactions = [
+        (
+            opening_dir,
+            f"TXN{100000 + i:06d}",
+            start_date + timedelta(seconds=i * (days * 86400) / total_transactions)
         )
+        for i in range(total_transactions)
+    ]
 
-        # Create each file with slightly different timestamps
-        file_offset_minutes = 0
-        for filename, size in OPENING_FILE_SPECS.items():
-            filepath = os.path.join(txn_dir, filename)
-
-            if filename.endswith('.xml'):
-                create_dummy_xml(filepath, size)
-            else:  # PDF
-                create_dummy_pdf(filepath, size)
+    # Create the month partitions up front so workers only create the transaction folders
+    for partition in {transaction_partition(timestamp) for _, _, timestamp in transactions}:
+        os.makedirs(os.path.join(opening_dir, partition), exist_ok=True)
 
-            # Set unique timestamp for each file (offset by a few minutes)
-            file_timestamp = transaction_timestamp + timedelta(minutes=file_offset_minutes)
-            set_file_timestamp(filepath, file_timestamp)
-            file_offset_minutes += 1
+    # Transactions are independent, so create them across all CPU cores.
+    # Workers are spawned rather than forked since upload threads may be running.
+    context = multiprocessing.get_context('spawn')
+    with context.Pool() as pool:
+        results = pool.imap_unordered(create_transaction, transactions, chunksize=TRANSACTIONS_PER_CHUNK)
+        for transaction_count, filepaths in enumerate(results, 1):
+            if upload_queue is not None:
+                for filepath in filepaths:
+                    upload_queue.put(filepath)
 
-        transaction_count += 1
-        if transaction_count % 100 == 0:
-            print(f"  Created {transaction_count}/{total_transactions} transactions")
+            if transaction_count % 100 == 0:
+                print(f"  Created {transaction_count}/{total_transactions} transactions")
 
     print(f"✓ Opening folder complete: {total_transactions} transactions")
-    return total_transactions
+
+    # Every transaction has the same fixed set of file sizes
+    total_size = total_transactions * sum(OPENING_FILE_SPECS.values())
+    return total_transactions, total_size
 
 
-def generate_customer_folder(base_dir, start_date, end_date):
-    """Generate Customer folder with various documents."""
+def generate_customer_folder(base_dir, start_date, end_date, upload_queue=None):
+    """
+    Generate Customer folder with various documents. Returns (count, total size in bytes).
+    Each completed file is put on upload_queue, if given.
+    """
     customer_dir = os.path.join(base_dir, "Customer")
     os.makedirs(customer_dir, exist_ok=True)
 
@@ -175,6 +264,7 @@ def generate_customer_folder(base_dir, start_date, end_date):
 
     print(f"Generating {total_docs} documents in Customer folder...")
 
+    total_size = 0
     for i in range(total_docs):
         # Randomly choose PDF or XML (70% PDF, 30% XML)
         file_ext = "pdf" if random.random() < 0.7 else "xml"
@@ -186,6 +276,7 @@ def generate_customer_folder(base_dir, start_date, end_date):
 
         # Random size between 300-1300 KB
         size = random.randint(CUSTOMER_FILE_MIN_SIZE, CUSTOMER_FILE_MAX_SIZE)
+        total_size += size
 
         if file_ext == 'xml':
             create_dummy_xml(filepath, size)
@@ -200,43 +291,179 @@ def generate_customer_folder(base_dir, start_date, end_date):
         )
         set_file_timestamp(filepath, file_timestamp)
 
-    print(f"✓ Customer folder complete: {total_docs} documents")
-    return total_docs
-
+        if upload_queue is not None:
+            upload_queue.put(filepath)
 
-def upload_to_s3(local_dir, bucket_name):
-    """Upload local directory to S3 bucket."""
-    print(f"\nUploading to S3 bucket: {bucket_name}")
-
-    cmd = [
-        "aws", "s3", "sync",
-        local_dir,
-        f"s3://{bucket_name}/",
-        "--quiet"
+    print(f"✓ Customer folder complete: {total_docs} documents")
+    return total_docs, total_size
+
+
+def guess_content_type(filepath):
+    """Guess a file's MIME type from its extension, as the AWS CLI does for uploads."""
+    return mimetypes.guess_type(filepath)[0] or 'binary/octet-stream'
+
+
+def upload_file(s3_client, transfer_config, local_dir, filepath, bucket_name):
+    """
+    Upload a file to S3, keyed by its path relative to local_dir.
+    Opening PDFs are copied server-side from their uploaded template instead.
+    """
+    s3_key = os.path.relpath(filepath, local_dir).replace(os.sep, '/')
+
+    # Keep the simulated file time as metadata, since LastModified will be the upload time
+    file_timestamp = datetime.fromtimestamp(os.stat(filepath).st_mtime, timezone.utc)
+    metadata = {'original-timestamp': file_timestamp.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    key_parts = s3_key.split('/')
+    if key_parts[0] == 'Opening' and key_parts[-1] in OPENING_TEMPLATE_FILES:
+        s3_client.copy_object(
+            Bucket=bucket_name,
+            Key=s3_key,
+            CopySource={'Bucket': bucket_name, 'Key': OPENING_TEMPLATE_PREFIX + key_parts[-1]},
+            Metadata=metadata,
+            MetadataDirective='REPLACE',
+            # REPLACE drops the template's Content-Type along with its metadata
+            ContentType='application/pdf'
+        )
+        return
+
+    s3_client.upload_file(
+        filepath,
+        bucket_name,
+        s3_key,
+        ExtraArgs={'Metadata': metadata, 'ContentType': guess_content_type(filepath)},
+        Config=transfer_config
+    )
+
+
+def upload_opening_templates(s3_client, transfer_config, bucket_name):
+    """Upload one copy of each identical Opening PDF under OPENING_TEMPLATE_PREFIX."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for filename in OPENING_TEMPLATE_FILES:
+            filepath = os.path.join(temp_dir, filename)
+            create_dummy_pdf(filepath, OPENING_FILE_SPECS[filename])
+            s3_client.upload_file(
+                filepath,
+                bucket_name,
+                OPENING_TEMPLATE_PREFIX + filename,
+                ExtraArgs={'ContentType': guess_content_type(filepath)},
+                Config=transfer_config
+            )
+
+
+def delete_opening_templates(s3_client, bucket_name):
+    """
+    Delete the Opening PDF templates once every copy has been made.
+    Returns an error message for each template that could not be deleted.
+    """
+    response = s3_client.delete_objects(
+        Bucket=bucket_name,
+        Delete={
+            'Objects': [{'Key': OPENING_TEMPLATE_PREFIX + filename} for filename in OPENING_TEMPLATE_FILES],
+            'Quiet': True
+        }
+    )
+    return [
+        f"could not delete {error.get('Key')}: {error.get('Message')}"
+        for error in response.get('Errors', [])
     ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
 
-    if result.returncode == 0:
-        print(f"✓ Upload complete!")
-    else:
-        print(f"✗ Upload failed: {result.stderr}")
+def upload_worker(s3_client, transfer_config, upload_queue, local_dir, bucket_name, errors):
+    """
+    Upload files taken from upload_queue until the None sentinel is received.
+    Once any upload has failed, remaining files are drained without uploading
+    so that generation never blocks on a full queue.
+    """
+    while True:
+        filepath = upload_queue.get()
+        if filepath is None:
+            # Put the sentinel back for the other workers
+            upload_queue.put(None)
+            return
+
+        if errors:
+            continue
+
+        try:
+            upload_file(s3_client, transfer_config, local_dir, filepath, bucket_name)
+        except Exception as e:
+            errors.append(e)
+
+
+def drain_queue(upload_queue):
+    """
+    Discard queued files until the None sentinel, so that generation can finish.
+    The sentinel is put back, so draining an already drained queue returns at once.
+    """
+    while upload_queue.get() is not None:
+        pass
+    upload_queue.put(None)
+
+
+def upload_queued_files(local_dir, bucket_name, upload_queue):
+    """
+    Upload files taken from upload_queue until the None sentinel is received.
+    Returns the errors of any failed uploads; other failures are raised.
+    """
+    # Imported here rather than at module level, since every spawned
+    # generation worker re-runs the module's top-level code
+    try:
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+        from botocore.exceptions import BotoCoreError, ClientError
+    except ImportError:
+        return ["boto3 is required. Install with: pip install boto3"]
+
+    s3_client = boto3.client(
+        's3',
+        config=Config(
+            max_pool_connections=UPLOAD_WORKERS,
+            retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'}
+        )
+    )
+
+    # Files are already spread across UPLOAD_WORKERS threads, so each
+    # transfer runs in its calling thread rather than starting its own pool
+    transfer_config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, use_threads=False)
+
+    errors = []
+    try:
+        upload_opening_templates(s3_client, transfer_config, bucket_name)
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+            for _ in range(UPLOAD_WORKERS):
+                pool.submit(upload_worker, s3_client, transfer_config, upload_queue, local_dir, bucket_name, errors)
+    finally:
+        # Also runs when only some of the templates were uploaded
+        try:
+            errors.extend(delete_opening_templates(s3_client, bucket_name))
+        except (BotoCoreError, ClientError) as e:
+            errors.append(e)
+
+    return errors
+
+
+def upload_to_s3(local_dir, bucket_name, upload_queue):
+    """
+    Upload files to S3 as they arrive on upload_queue, until a None sentinel is put on it.
+    Returns True if every file was uploaded. Whatever fails, the queue is
+    drained so that generation never blocks on it.
+    """
+    try:
+        errors = upload_queued_files(local_dir, bucket_name, upload_queue)
+    except Exception as e:
+        errors = [e]
+
+    if errors:
+        print(f"✗ Upload failed: {errors[0]}")
+        drain_queue(upload_queue)
         return False
 
+    print(f"✓ Upload complete!")
     return True
 
 
-def get_folder_size(folder_path):
-    """Calculate total size of a folder."""
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(folder_path):
-        for filename in filenames:
-            filepath = os.path.join(dirpath, filename)
-            if os.path.exists(filepath):
-                total_size += os.path.getsize(filepath)
-    return total_size
-
-
 def format_size(size_bytes):
     """Format bytes to human readable format."""
     for unit in ['B', 'KB', 'MB', 'GB']:
@@ -269,17 +496,31 @@ def main():
 
     os.makedirs(LOCAL_BASE_DIR, exist_ok=True)
 
-    # Generate folders
+    # Generate folders, uploading each file to S3 as soon as it is written
     print("\n" + "=" * 60)
-    print("GENERATING LOCAL FILES")
+    print("GENERATING LOCAL FILES AND UPLOADING TO S3")
     print("=" * 60)
-
-    opening_count = generate_opening_folder(LOCAL_BASE_DIR, start_date, end_date)
-    customer_count = generate_customer_folder(LOCAL_BASE_DIR, start_date, end_date)
+    print(f"Uploading to S3 bucket: {BUCKET_NAME}")
+
+    upload_queue = queue.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+    with ThreadPoolExecutor(max_workers=1) as uploader:
+        upload_result = uploader.submit(upload_to_s3, LOCAL_BASE_DIR, BUCKET_NAME, upload_queue)
+
+        try:
+            opening_count, opening_size = generate_opening_folder(
+                LOCAL_BASE_DIR, start_date, end_date, upload_queue
+            )
+            customer_count, customer_size = generate_customer_folder(
+                LOCAL_BASE_DIR, start_date, end_date, upload_queue
+            )
+        finally:
+            # Tell the uploader that no more files are coming
+            upload_queue.put(None)
+
+        print("\nWaiting for remaining uploads...")
+        success = upload_result.result()
 
     # Calculate statistics
-    opening_size = get_folder_size(os.path.join(LOCAL_BASE_DIR, "Opening"))
-    customer_size = get_folder_size(os.path.join(LOCAL_BASE_DIR, "Customer"))
     total_size = opening_size + customer_size
 
     print("\n" + "=" * 60)
@@ -296,13 +537,6 @@ def main():
     print(f"  - Total files: {opening_count * 4 + customer_count}")
     print(f"  - Total size: {format_size(total_size)}")
 
-    # Upload to S3
-    print("\n" + "=" * 60)
-    print("UPLOADING TO S3")
-    print("=" * 60)
-
-    success = upload_to_s3(LOCAL_BASE_DIR, BUCKET_NAME)
-
     if success:
         print("\n" + "=" * 60)
         print("✓ SUCCESS - S3 bucket structure created!")
@@ -10,23 +10,63 @@ Can run as a cron job at the start of each month.
 """
 
 import os
+import re
 import sys
 import zipfile
-import tempfile
 import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import argparse
 
 try:
     import boto3
-    from botocore.exceptions import ClientError
+    import botocore.exceptions
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError, ClientError, IncompleteReadError, ReadTimeoutError
+    # Failures while reading an object body, which botocore does not retry.
+    # ResponseStreamingError only exists in newer botocore releases.
+    BODY_READ_ERRORS = (
+        IncompleteReadError,
+        ReadTimeoutError,
+        getattr(botocore.exceptions, 'ResponseStreamingError', IncompleteReadError)
+    )
     HAS_BOTO3 = True
 except ImportError:
     HAS_BOTO3 = False
     print("Warning: boto3 not installed. S3 features will not be available.")
     print("Install with: pip install boto3")
 
+# Keys such as Customer/CUST_YYYYMMDD_####.pdf carry their document date in the name
+KEY_DATE_PATTERN = re.compile(r'.*_(\d{8})_')
+
+# Concurrent HeadObject requests when reading object metadata
+HEAD_OBJECT_WORKERS = 32
+
+# Concurrent downloads when building a ZIP archive from S3
+DOWNLOAD_WORKERS = 20
+
+# Object bytes each download keeps in memory before spilling to a temporary file
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# Buffer size when copying S3 bodies and local files into a ZIP archive
+# (shutil.copyfileobj defaults to 64 KiB and zipfile.write to 8 KiB)
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Top-level folders archived into one ZIP each
+ARCHIVE_FOLDERS = ('Opening', 'Customer')
+
+# Folders whose S3 keys are partitioned by month as <folder>/YYYY/MM/, mapped
+# to the prefix of keys uploaded before partitioning (Opening/TXN######/)
+PARTITIONED_FOLDERS = {'Opening': 'Opening/TXN'}
+
+# Attempts per S3 request. botocore's standard retry mode backs off and only
+# retries throttling, 5xx and connection errors, never 403/404
+S3_MAX_ATTEMPTS = 3
+
 
 class MonthlyArchiver:
     """Handle monthly archiving of S3 transaction documents."""
@@ -49,7 +89,15 @@ class MonthlyArchiver:
         if use_s3:
             if not HAS_BOTO3:
                 raise RuntimeError("boto3 is required for S3 operations. Install with: pip install boto3")
-            self.s3_client = boto3.client('s3')
+            # Size the connection pool for the concurrent metadata lookups and
+            # the downloads of every folder archive, which can all overlap
+            self.s3_client = boto3.client(
+                's3',
+                config=Config(
+                    max_pool_connections=HEAD_OBJECT_WORKERS + DOWNLOAD_WORKERS * len(ARCHIVE_FOLDERS),
+                    retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'}
+                )
+            )
         else:
             if not self.local_data_dir or not self.local_data_dir.exists():
                 raise ValueError("local_data_dir must exist when use_s3=False")
@@ -89,10 +137,56 @@ class MonthlyArchiver:
 
         return first_of_previous_month, end_of_previous_month
 
+    def list_folder_files(self, folder_name, start_date, end_date):
+        """
+        List the files of a top-level folder that fall within the date range.
+
+        Partitioned S3 folders only list the month's YYYY/MM/ prefix, so the
+        work stays proportional to one month rather than the whole bucket.
+        Keys uploaded before partitioning are still selected by date.
+
+        Args:
+            folder_name: Folder name (Opening or Customer)
+            start_date: Start datetime
+            end_date: End datetime
+
+        Returns:
+            List of S3 object keys or local file paths
+        """
+        if not self.use_s3:
+            return self.list_local_files(folder_name, start_date, end_date)
+
+        if folder_name in PARTITIONED_FOLDERS:
+            files = self.list_s3_keys(f"{folder_name}/{start_date.strftime('%Y/%m')}/")
+            files += self.list_s3_files(PARTITIONED_FOLDERS[folder_name], start_date, end_date)
+            return files
+
+        return self.list_s3_files(f'{folder_name}/', start_date, end_date)
+
+    def list_s3_keys(self, prefix):
+        """
+        List every S3 object key under a prefix.
+
+        Args:
+            prefix: S3 prefix (folder path)
+
+        Returns:
+            List of S3 object keys
+        """
+        files = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                files.append(obj['Key'])
+
+        return files
+
     def list_s3_files(self, prefix, start_date, end_date):
         """
         List S3 files in a prefix that fall within the date range.
-        Uses object metadata 'original-timestamp' if available, otherwise falls back to LastModified.
+        Uses the date in the key name if present (e.g. CUST_YYYYMMDD_####.pdf). Otherwise
+        uses object metadata 'original-timestamp' if available, falling back to LastModified.
 
         Args:
             prefix: S3 prefix (folder path)
@@ -103,6 +197,7 @@ class MonthlyArchiver:
             List of S3 object keys
         """
         files = []
+        candidates = []
         paginator = self.s3_client.get_paginator('list_objects_v2')
 
         for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
@@ -110,36 +205,86 @@ class MonthlyArchiver:
                 continue
 
             for obj in page['Contents']:
-                # Get object metadata to check for original-timestamp
-                try:
-                    head_response = self.s3_client.head_object(
-                        Bucket=self.bucket_name,
-                        Key=obj['Key']
-                    )
-                    metadata = head_response.get('Metadata', {})
-
-                    # Use original-timestamp from metadata if available
-                    if 'original-timestamp' in metadata:
-                        # Parse the timestamp (format: YYYY-MM-DDTHH:MM:SS)
-                        timestamp_str = metadata['original-timestamp']
-                        file_date = datetime.strptime(timestamp_str, '%Y-%m-%dT%H:%M:%S')
-                        # Make timezone-aware for comparison
-                        file_date = file_date.replace(tzinfo=timezone.utc)
-                    else:
-                        # Fall back to LastModified
-                        file_date = obj['LastModified']
+                # Use the date encoded in the key when there is one
+                key_date = self.parse_key_date(obj['Key'])
+                if key_date is not None:
+                    if start_date.date() <= key_date <= end_date.date():
+                        files.append(obj['Key'])
+                    continue
+
+                # An object uploaded before the range cannot carry an original
+                # timestamp inside it, so skip the metadata lookup entirely
+                if obj['LastModified'] < start_date:
+                    continue
 
+                candidates.append(obj)
+
+        # Read metadata for the remaining objects concurrently
+        if candidates:
+            with ThreadPoolExecutor(max_workers=HEAD_OBJECT_WORKERS) as pool:
+                file_dates = pool.map(self.get_object_timestamp, candidates)
+                for obj, file_date in zip(candidates, file_dates):
                     # Check if file's date is within our range
                     if start_date <= file_date <= end_date:
                         files.append(obj['Key'])
 
-                except Exception as e:
-                    # If metadata read fails, fall back to LastModified
-                    if start_date <= obj['LastModified'] <= end_date:
-                        files.append(obj['Key'])
-
         return files
 
+    def get_object_timestamp(self, obj):
+        """
+        Get the original timestamp of an S3 object.
+        Uses object metadata 'original-timestamp' if available, otherwise falls back to LastModified.
+
+        Args:
+            obj: Object entry from a list_objects_v2 page
+
+        Returns:
+            Timezone-aware datetime of the object
+        """
+        try:
+            head_response = self.s3_client.head_object(
+                Bucket=self.bucket_name,
+                Key=obj['Key']
+            )
+        except (BotoCoreError, ClientError):
+            # If metadata read fails, fall back to LastModified
+            return obj['LastModified']
+
+        metadata = head_response.get('Metadata', {})
+
+        # Use original-timestamp from metadata if available
+        if 'original-timestamp' in metadata:
+            # Parse the timestamp (format: YYYY-MM-DDTHH:MM:SS)
+            try:
+                file_date = datetime.strptime(metadata['original-timestamp'], '%Y-%m-%dT%H:%M:%S')
+            except ValueError:
+                return obj['LastModified']
+            # Make timezone-aware for comparison
+            return file_date.replace(tzinfo=timezone.utc)
+
+        # Fall back to LastModified
+        return obj['LastModified']
+
+    @staticmethod
+    def parse_key_date(key):
+        """
+        Extract the date encoded in an S3 key name.
+
+        Args:
+            key: S3 object key
+
+        Returns:
+            date parsed from the key, or None if the key carries no date
+        """
+        match = KEY_DATE_PATTERN.match(key)
+        if not match:
+            return None
+
+        try:
+            return datetime.strptime(match.group(1), '%Y%m%d').date()
+        except ValueError:
+            return None
+
     def list_local_files(self, folder_name, start_date, end_date):
         """
         List local files that fall within the date range.
@@ -158,24 +303,92 @@ class MonthlyArchiver:
         if not folder_path.exists():
             return files
 
-        for file_path in folder_path.rglob('*'):
-            if file_path.is_file():
-                # Get file modification time
-                mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
+        # Compare raw modification times rather than building a datetime per file
+        start_ts = start_date.timestamp()
+        end_ts = end_date.timestamp()
 
-                if start_date <= mtime <= end_date:
-                    # Get relative path from data directory
-                    rel_path = file_path.relative_to(self.local_data_dir)
-                    files.append(str(rel_path))
+        for entry in self.scan_files(folder_path):
+            if start_ts <= entry.stat().st_mtime <= end_ts:
+                # Get relative path from data directory
+                files.append(os.path.relpath(entry.path, self.local_data_dir))
 
         return files
 
-    def download_s3_file(self, s3_key, local_path):
-        """Download a file from S3."""
-        local_path.parent.mkdir(parents=True, exist_ok=True)
-        self.s3_client.download_file(self.bucket_name, s3_key, str(local_path))
+    @classmethod
+    def scan_files(cls, directory):
+        """
+        Recursively yield the regular files under a directory.
+        Uses os.scandir, whose entries know their file type from the directory
+        listing, so no extra stat call is needed to tell files from folders.
+
+        Args:
+            directory: Directory to scan
+
+        Yields:
+            os.DirEntry for each file
+        """
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from cls.scan_files(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def fetch_s3_object(self, s3_key):
+        """
+        Download an S3 object into a temporary file, kept in memory up to
+        SPOOL_MAX_SIZE bytes and spilled to disk beyond that.
+
+        botocore retries the request itself but not a failure while reading
+        the body, so in that case the object is requested again.
+
+        Args:
+            s3_key: S3 object key
+
+        Returns:
+            Temporary file holding the object content, positioned at the start
+        """
+        for attempt in range(S3_MAX_ATTEMPTS):
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            try:
+                shutil.copyfileobj(response['Body'], spool, length=COPY_BUFFER_SIZE)
+                spool.seek(0)
+                return spool
+            except Exception as e:
+                spool.close()
+                if not isinstance(e, BODY_READ_ERRORS) or attempt == S3_MAX_ATTEMPTS - 1:
+                    raise
+            time.sleep(2 ** attempt)
+
+    def iter_s3_objects(self, s3_keys):
+        """
+        Download S3 objects in parallel, yielding their content in order.
+
+        At most DOWNLOAD_WORKERS objects are downloading or waiting to be
+        written at a time, each holding up to SPOOL_MAX_SIZE bytes in memory.
+
+        Args:
+            s3_keys: S3 object keys to fetch
 
-    def create_zip_archive(self, files, zip_path, folder_prefix, temp_dir):
+        Yields:
+            Tuples of (key, temporary file holding the content), which the
+            caller closes
+        """
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            pending = deque()
+            for s3_key in s3_keys:
+                pending.append((s3_key, pool.submit(self.fetch_s3_object, s3_key)))
+
+                if len(pending) >= DOWNLOAD_WORKERS:
+                    s3_key, future = pending.popleft()
+                    yield s3_key, future.result()
+
+            while pending:
+                s3_key, future = pending.popleft()
+                yield s3_key, future.result()
+
+    def create_zip_archive(self, files, zip_path, folder_prefix):
         """
         Create a ZIP archive from a list of files.
 
@@ -183,24 +396,28 @@ class MonthlyArchiver:
             files: List of file keys/paths
             zip_path: Output ZIP file path
             folder_prefix: S3 prefix to filter by (e.g., "Opening/")
-            temp_dir: Temporary directory for downloads
         """
         if not files:
             print(f"  No files found for {folder_prefix} - skipping ZIP creation")
             return 0
 
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_key in files:
-                if self.use_s3:
-                    # Download from S3 to temp dir
-                    local_file = Path(temp_dir) / file_key
-                    self.download_s3_file(file_key, local_file)
-                else:
-                    # Use local file
+            if self.use_s3:
+                # Downloads run in parallel; zipfile is not thread-safe, so each
+                # object is written into the ZIP with its original path from here
+                for file_key, spool in self.iter_s3_objects(files):
+                    zinfo = zipfile.ZipInfo(file_key, date_time=time.localtime(time.time())[:6])
+                    zinfo.compress_type = self.zip_compress_type(file_key)
+                    with spool, zipf.open(zinfo, 'w', force_zip64=True) as zip_member:
+                        shutil.copyfileobj(spool, zip_member, length=COPY_BUFFER_SIZE)
+            else:
+                for file_key in files:
+                    # Use local file, adding it with original path structure
                     local_file = self.local_data_dir / file_key
-
-                # Add to ZIP with original path structure
-                zipf.write(local_file, arcname=file_key)
+                    zinfo = zipfile.ZipInfo.from_file(local_file, arcname=file_key)
+                    zinfo.compress_type = self.zip_compress_type(file_key)
+                    with open(local_file, 'rb') as source, zipf.open(zinfo, 'w') as zip_member:
+                        shutil.copyfileobj(source, zip_member, length=COPY_BUFFER_SIZE)
 
         return len(files)
 
@@ -236,46 +453,32 @@ class MonthlyArchiver:
             'customer_zip': None
         }
 
-        # Create temporary directory for downloads
-        with tempfile.TemporaryDirectory() as temp_dir:
-
-            # Process Opening folder
-            print("Processing Opening folder...")
-            if self.use_s3:
-                opening_files = self.list_s3_files('Opening/', start_date, end_date)
-            else:
-                opening_files = self.list_local_files('Opening', start_date, end_date)
-
-            print(f"  Found {len(opening_files)} files")
+        # Each folder gets its own ZipFile, so the archives are built in parallel
+        # while later folders are still being listed. zlib releases the GIL, so
+        # the compression of each archive can run on its own core.
+        archive_jobs = []
+        with ThreadPoolExecutor(max_workers=len(ARCHIVE_FOLDERS)) as pool:
+            for folder_name in ARCHIVE_FOLDERS:
+                print(f"Processing {folder_name} folder...")
+                folder_files = self.list_folder_files(folder_name, start_date, end_date)
 
-            if opening_files:
-                opening_zip_name = f"Opening_{month_str}.zip"
-                opening_zip_path = self.output_dir / opening_zip_name
-                files_count = self.create_zip_archive(opening_files, opening_zip_path, 'Opening/', temp_dir)
-                stats['opening_files'] = files_count
-                stats['opening_zip'] = str(opening_zip_path)
+                print(f"  Found {len(folder_files)} files")
 
-                zip_size = opening_zip_path.stat().st_size
-                print(f"  Created: {opening_zip_name} ({self.format_size(zip_size)}, {files_count} files)")
+                if folder_files:
+                    zip_path = self.output_dir / f"{folder_name}_{month_str}.zip"
+                    future = pool.submit(self.create_zip_archive, folder_files, zip_path, f'{folder_name}/')
+                    archive_jobs.append((folder_name, zip_path, future))
 
-            # Process Customer folder
-            print("\nProcessing Customer folder...")
-            if self.use_s3:
-                customer_files = self.list_s3_files('Customer/', start_date, end_date)
-            else:
-                customer_files = self.list_local_files('Customer', start_date, end_date)
+            if archive_jobs:
+                print("\nCreating ZIP archives...")
 
-            print(f"  Found {len(customer_files)} files")
+            for folder_name, zip_path, future in archive_jobs:
+                files_count = future.result()
+                stats[f'{folder_name.lower()}_files'] = files_count
+                stats[f'{folder_name.lower()}_zip'] = str(zip_path)
 
-            if customer_files:
-                customer_zip_name = f"Customer_{month_str}.zip"
-                customer_zip_path = self.output_dir / customer_zip_name
-                files_count = self.create_zip_archive(customer_files, customer_zip_path, 'Customer/', temp_dir)
-                stats['customer_files'] = files_count
-                stats['customer_zip'] = str(customer_zip_path)
-
-                zip_size = customer_zip_path.stat().st_size
-                print(f"  Created: {customer_zip_name} ({self.format_size(zip_size)}, {files_count} files)")
+                zip_size = zip_path.stat().st_size
+                print(f"  Created: {zip_path.name} ({self.format_size(zip_size)}, {files_count} files)")
 
         # Upload to S3 if requested
         if upload_to_s3 and self.use_s3:
@@ -308,6 +511,23 @@ class MonthlyArchiver:
 
         return stats
 
+    @staticmethod
+    def zip_compress_type(file_key):
+        """
+        Get the ZIP compression method for a file.
+        PDFs already contain compressed streams, so they are stored as-is
+        rather than spending CPU on deflating them again.
+
+        Args:
+            file_key: File key/path
+
+        Returns:
+            zipfile compression constant
+        """
+        if file_key.lower().endswith('.pdf'):
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
     @staticmethod
     def format_size(size_bytes):
         """Format bytes to human readable format."""